@@ -2,33 +2,93 @@
 
 # Check Python version before imports
 import sys
-if sys.version_info < (3, 9):
-    print("Error: Python 3.9 or higher is required")
+if sys.version_info < (3, 11):
+    print("Error: Python 3.11 or higher is required")
     print(f"You are using Python {sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}")
     print("\nPlease upgrade Python:")
     print("  - Download from: https://www.python.org/downloads/")
     print("  - Or use: brew install python3 (macOS)")
-    print("  - Or use: sudo apt install python3.9 (Linux)")
+    print("  - Or use: sudo apt install python3.11 (Linux)")
     sys.exit(1)
 
+import argparse
+import contextlib
+import copy
+import errno
+import functools
+import itertools
 import json
+import operator
 import os
 import shutil
+import subprocess
+import tempfile
 import platform
 from pathlib import Path
 from datetime import datetime
 import re
 import logging
-from typing import Optional
-
-import click
-from sqlcipher3 import dbapi2 as sqlcipher
-import markdown
-from bs4 import BeautifulSoup
+import textwrap
+import importlib.util
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import TextIO
 
 
 logger = logging.getLogger(__name__)
 
+# BeautifulSoup parser: the C-backed lxml if installed (signal-export[fast])
+_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# Likewise orjson for JSON; its JSONDecodeError subclasses json's
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# A message line of index.md: [date time] sender_info: body
+# Where sender_info can include [phone], (Profile: name), etc.
+# Matched on bytes so that lines only need decoding once they are used
+_MSG_RE = re.compile(rb"^(\[\d{4}-\d{2}-\d{2},? \d{2}:\d{2}\])(.+?:)(.*\n?)")
+
+# A single-line message body without any markdown syntax, optionally followed by the
+# MsgID comment from make_simple. markdown would only wrap it in <p>, so create_html
+# does that itself; the lookahead keeps out lines that start a list, heading or quote
+_PLAIN_RE = re.compile(
+    r" {0,3}((?![-+*=#>]|\d+[.)])[^\s\\`*_\[\]<>&][^\n\r\t\\`*_\[\]<>&]*"
+    r"(?:<!-- MsgID: [^\n<>]* -->)?[ ]*)\n?"
+)
+
+# The MsgID comment that make_simple appends to a message, which carries no tags
+_MSGID_RE = re.compile(r"<!-- MsgID: [^\n<>]* -->\s*\Z")
+
+# Bare links in message bodies, turned into anchors by create_html
+_LINK_RE = re.compile(r"https?://\S+")
+
+# ASCII characters that fix_names drops from names, as a str.translate table
+_NON_ALNUM_ASCII = dict.fromkeys(i for i in range(128) if not chr(i).isalnum())
+
+# Errors from os.link that mean the file has to be copied instead: another file system,
+# or one without hardlinks (FAT drives on Windows report EINVAL)
+_LINK_UNSUPPORTED = frozenset(
+    (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK, errno.EINVAL)
+)
+
+# Fields of the messages.json column that the export uses
+_MESSAGE_FIELDS = (
+    "timestamp",
+    "sent_at",
+    "body",
+    "type",
+    "source",
+    "sourceUuid",
+    "id",
+    "serverGuid",
+    "guid",
+    "attachments",
+)
+
 
 def check_apple_silicon() -> None:
     """Check if running on Apple Silicon and warn if in native ARM mode."""
@@ -45,8 +105,7 @@ def check_apple_silicon() -> None:
 
 def check_sqlcipher_cli() -> bool:
     """Check if sqlcipher CLI is available."""
-    result = os.system("which sqlcipher > /dev/null 2>&1" if sys.platform != "win32" else "where sqlcipher > nul 2>&1")
-    return result == 0
+    return shutil.which("sqlcipher") is not None
 
 
 def source_location() -> Path:
@@ -68,56 +127,127 @@ def source_location() -> Path:
     return source_path
 
 
-def copy_attachments(src: Path, dest: Path, conversations: dict, contacts: dict) -> None:
-    """Copy attachments and reorganise in destination directory."""
+def subdirs(path: Path) -> Iterator[Path]:
+    """Yield the sub-directories of path, using the file types cached by scandir."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield Path(entry.path)
 
-    src_att = Path(src) / "attachments.noindex"
-    dest = Path(dest)
 
-    for key, messages in conversations.items():
-        name = contacts[key]["name"]
-        logger.info(f"\tCopying attachments for: {name}")
-        # some contact names are None
-        if name is None:
-            name = "None"
-        contact_path = dest / name / "media"
-        contact_path.mkdir(exist_ok=True, parents=True)
-        for msg in messages:
-            try:
-                attachments = msg["attachments"]
-                if attachments:
-                    date = datetime.fromtimestamp(msg["timestamp"] / 1000.0).strftime(
-                        "%Y-%m-%d"
+def replace_file(dst_file: Path, create) -> None:
+    """
+    Call create with a temporary path next to dst_file, then move the result onto dst_file.
+    An existing dst_file is replaced without ever being opened for writing.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=".", dir=dst_file.parent)
+    os.close(fd)
+    os.unlink(tmp)
+    try:
+        create(tmp)
+        os.replace(tmp, dst_file)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def copy_file(src_file: Path, dst_file: Path, name: str, link: bool = False) -> None:
+    """
+    Copy a single attachment, logging instead of failing if the source is missing.
+    With link, hardlink it instead, or copy it where the destination is on another file system
+    or does not support links. An existing destination may then itself be a link to another
+    attachment, so it is replaced rather than written through.
+    """
+    try:
+        if not link:
+            shutil.copy2(src_file, dst_file)
+            return
+        try:
+            os.link(src_file, dst_file)
+        except FileExistsError:
+            replace_file(dst_file, functools.partial(os.link, src_file))
+    except FileNotFoundError:
+        logger.info(f"\t\tAttachment not found:\t{name} {dst_file.name}")
+    except OSError as e:
+        if e.errno not in _LINK_UNSUPPORTED:
+            raise
+        replace_file(dst_file, functools.partial(shutil.copy2, src_file))
+
+
+def copy_file_after(
+    previous: Future, src_file: Path, dst_file: Path, name: str, link: bool = False
+) -> None:
+    """Copy a single attachment once an earlier copy to the same destination has finished."""
+    wait([previous])
+    copy_file(src_file, dst_file, name, link)
+
+
+def copy_attachments(
+    src_att: Path,
+    contact_path: Path,
+    name: str,
+    msg: dict,
+    day: str,
+    pool: ThreadPoolExecutor,
+    pending: dict[Path, Future],
+    link: bool = False,
+) -> list[Future]:
+    """
+    Reorganise the attachments of a message and copy them into the destination directory.
+    day prefixes the new file names, as formatted for the message line by export_conversation.
+    The copies themselves run on pool, so that the file system calls of many files overlap.
+    pending maps destinations to their latest copy: copies to a destination that is already
+    taken run after it, so that the last message still wins, as with serial copies.
+    link hardlinks the attachments instead of copying them, see copy_file.
+    """
+
+    futures = []
+    try:
+        attachments = msg["attachments"]
+        if attachments:
+            for i, att in enumerate(attachments):
+                try:
+                    att[
+                        "fileName"
+                    ] = f"{day}_{i:02}_{att['fileName']}".replace(
+                        " ", "_"
+                    ).replace(
+                        "/", "-"
+                    )
+                    # account for erroneous backslash in path
+                    att_path = Path(att["path"]).as_posix()
+                    dst_file = contact_path / att["fileName"]
+                    previous = pending.get(dst_file)
+                    if previous is None:
+                        future = pool.submit(copy_file, src_att / att_path, dst_file, name, link)
+                    else:
+                        future = pool.submit(
+                            copy_file_after, previous, src_att / att_path, dst_file, name, link
+                        )
+                    pending[dst_file] = future
+                    futures.append(future)
+                except KeyError:
+                    logger.info(
+                        f"\t\tBroken attachment:\t{name}\t{att['fileName']}"
                     )
-                    for i, att in enumerate(attachments):
-                        try:
-                            att[
-                                "fileName"
-                            ] = f"{date}_{i:02}_{att['fileName']}".replace(
-                                " ", "_"
-                            ).replace(
-                                "/", "-"
-                            )
-                            # account for erroneous backslash in path
-                            att_path = Path(att["path"]).as_posix()
-                            shutil.copy2(
-                                src_att / att_path, contact_path / att["fileName"]
-                            )
-                        except KeyError:
-                            logger.info(
-                                f"\t\tBroken attachment:\t{name}\t{att['fileName']}"
-                            )
-                        except FileNotFoundError:
-                            logger.info(
-                                f"\t\tAttachment not found:\t{name} {att['fileName']}"
-                            )
-            except KeyError:
-                logger.info(f"\t\tNo attachments for a message: {name}")
-
-
-def get_sender_info(msg: dict, contacts: dict, is_group: bool) -> dict:
+    except KeyError:
+        logger.info(f"\t\tNo attachments for a message: {name}")
+    return futures
+
+
+@functools.lru_cache(maxsize=4096)
+def format_minute(minute: int) -> str:
+    """Format minutes since the epoch for index.md, cached as messages cluster in time."""
+    return datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M")
+
+
+def get_sender_info(
+    msg: dict, contacts: dict, is_group: bool, contacts_by_number: dict
+) -> dict:
     """
     Extract comprehensive sender information for archival purposes.
+    contacts_by_number maps phone numbers to contacts, used to resolve group senders.
     Returns dict with display_name, phone_number, profile_name, and source_id.
     """
     sender_info = {
@@ -144,13 +274,11 @@ def get_sender_info(msg: dict, contacts: dict, is_group: bool) -> dict:
     try:
         if is_group:
             # In group chats, match sender by source ID or phone number
-            for contact_id, contact in contacts.items():
-                contact_num = contact.get("number")
-                if contact_num and source_id and contact_num == source_id:
-                    sender_info["display_name"] = contact.get("name") or contact.get("profileName") or source_id
-                    sender_info["phone_number"] = contact_num
-                    sender_info["profile_name"] = contact.get("profileName")
-                    break
+            contact = contacts_by_number.get(source_id) if source_id else None
+            if contact is not None:
+                sender_info["display_name"] = contact.get("name") or contact.get("profileName") or source_id
+                sender_info["phone_number"] = contact["number"]
+                sender_info["profile_name"] = contact.get("profileName")
             else:
                 # Sender not found in contacts, use source ID
                 sender_info["display_name"] = f"Unknown ({source_id[:8]}...)" if source_id else "Unknown"
@@ -188,108 +316,220 @@ def format_sender_for_archive(sender_info: dict) -> str:
     return " ".join(parts)
 
 
-def make_simple(dest: Path, conversations: dict, contacts: dict) -> None:
-    """Output each conversation into a simple text file with enhanced sender identification."""
+def export_conversation(
+    src_att: Path,
+    contact_path: Path,
+    name: str,
+    is_group: bool,
+    rows: Iterable[tuple[str, dict]],
+    mdfile: TextIO,
+    contacts: dict,
+    contacts_by_number: dict,
+    pool: ThreadPoolExecutor,
+    pending: dict[Path, Future],
+    link: bool = False,
+) -> list[Future]:
+    """
+    Write the messages of one conversation to its index.md and copy their attachments,
+    visiting each message once. Returns the futures of the submitted copies.
+    """
 
-    dest = Path(dest)
-    for key, messages in conversations.items():
-        name = contacts[key]["name"]
-        logger.info(f"\tDoing markdown for: {name}")
-        is_group = contacts[key]["is_group"]
-        # some contact names are None
-        if name is None:
-            name = "None"
-
-        with open(dest / name / "index.md", "a") as mdfile:
-            # Write conversation metadata header
-            print("# Signal Conversation Export", file=mdfile)
-            print(f"**Conversation:** {contacts[key].get('name') or 'Unknown'}", file=mdfile)
-            print(f"**Conversation ID:** {key}", file=mdfile)
-            print(f"**Type:** {'Group Chat' if is_group else 'Direct Message'}", file=mdfile)
-            if contacts[key].get("number"):
-                print(f"**Phone Number:** {contacts[key]['number']}", file=mdfile)
-            if contacts[key].get("profileName"):
-                print(f"**Profile Name:** {contacts[key]['profileName']}", file=mdfile)
-            if is_group and "members" in contacts[key]:
-                print(f"**Group Members:** {', '.join(contacts[key]['members'])}", file=mdfile)
-            print(f"**Export Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", file=mdfile)
-            print(f"**Total Messages:** {len(messages)}", file=mdfile)
-            print("\n---\n", file=mdfile)
-            for msg in messages:
-                timestamp = (
-                    msg["timestamp"]
-                    if "timestamp" in msg
-                    else msg["sent_at"]
-                    if "sent_at" in msg
-                    else None
-                )
+    futures = []
+    for _, msg in rows:
+        timestamp = (
+            msg["timestamp"]
+            if "timestamp" in msg
+            else msg["sent_at"]
+            if "sent_at" in msg
+            else None
+        )
 
-                if timestamp is None:
-                    logger.info("\t\tNo timestamp or sent_at; date set to 1970")
-                    date = "1970-01-01 00:00"
-                else:
-                    date = datetime.fromtimestamp(timestamp / 1000.0).strftime(
-                        "%Y-%m-%d %H:%M"
-                    )
+        if timestamp is None:
+            logger.info("\t\tNo timestamp or sent_at; date set to 1970")
+            date = "1970-01-01 00:00"
+        else:
+            date = format_minute(timestamp // 60000)
 
-                logger.info(f"\t\tDoing {name}, msg: {date}")
+        futures += copy_attachments(
+            src_att, contact_path, name, msg, date[:10], pool, pending, link
+        )
 
-                # Get message body
-                try:
-                    body = msg["body"]
-                except KeyError:
-                    logger.info(f"\t\tNo body:\t\t{date}")
-                    body = ""
-                if body is None:
-                    body = ""
-                body = body.replace("`", "")  # stop md code sections forming
-                body += "  "  # so that markdown newlines
-
-                # Get comprehensive sender information
-                sender_info = get_sender_info(msg, contacts, is_group)
-                sender = format_sender_for_archive(sender_info)
-
-                # Get message ID if available for audit trail
-                msg_id = msg.get("id", "")
-                msg_uuid = msg.get("serverGuid") or msg.get("guid", "")
-
-                # Add attachments to body
-                try:
-                    attachments = msg["attachments"]
-                    for att in attachments:
-                        file_name = att["fileName"]
-                        # some file names are None
-                        if file_name is None:
-                            file_name = "None"
-                        path = Path("media") / file_name
-                        path = Path(str(path).replace(" ", "%20"))
-                        if path.suffix and path.suffix.split(".")[1] in [
-                            "png",
-                            "jpg",
-                            "jpeg",
-                            "gif",
-                            "tif",
-                            "tiff",
-                        ]:
-                            body += "!"
-                        body += f"[{file_name}](./{path})  "
-                except KeyError:
-                    logger.info(f"\t\tNo attachments for a message: {name}, {date}")
+        logger.info(f"\t\tDoing {name}, msg: {date}")
+
+        # Get message body
+        try:
+            body = msg["body"]
+        except KeyError:
+            logger.info(f"\t\tNo body:\t\t{date}")
+            body = ""
+        if body is None:
+            body = ""
+        body = body.replace("`", "")  # stop md code sections forming
+        body += "  "  # so that markdown newlines
+
+        # Get comprehensive sender information
+        sender_info = get_sender_info(msg, contacts, is_group, contacts_by_number)
+        sender = format_sender_for_archive(sender_info)
+
+        # Get message ID if available for audit trail
+        msg_id = msg.get("id", "")
+        msg_uuid = msg.get("serverGuid") or msg.get("guid", "")
+
+        # Add attachments to body
+        try:
+            attachments = msg["attachments"]
+            for att in attachments:
+                file_name = att["fileName"]
+                # some file names are None
+                if file_name is None:
+                    file_name = "None"
+                path = Path("media") / file_name
+                path = Path(str(path).replace(" ", "%20"))
+                if path.suffix and path.suffix.split(".")[1] in [
+                    "png",
+                    "jpg",
+                    "jpeg",
+                    "gif",
+                    "tif",
+                    "tiff",
+                ]:
+                    body += "!"
+                body += f"[{file_name}](./{path})  "
+        except KeyError:
+            logger.info(f"\t\tNo attachments for a message: {name}, {date}")
+
+        # Format message with enhanced metadata
+        # Include message UUID if available for audit trail
+        msg_line = f"[{date}] {sender}: {body}"
+        if msg_uuid:
+            msg_line += f"  <!-- MsgID: {msg_uuid} -->"
+
+        mdfile.write(msg_line + "\n")
+
+    return futures
+
+
+def make_simple(
+    src: Path,
+    dest: Path,
+    messages: Iterator[tuple[str, dict]],
+    contacts: dict,
+    link: bool = False,
+) -> None:
+    """
+    Output each conversation into a simple text file with enhanced sender identification,
+    copying attachments as their messages stream past, or hardlinking them with link.
+    Expects messages grouped by conversation, as yielded by fetch_data.
+    """
+
+    src_att = Path(src) / "attachments.noindex"
+    dest = Path(dest)
+
+    # first contact with a given number wins, as group senders are matched by number
+    contacts_by_number = {}
+    for contact in contacts.values():
+        if contact.get("number"):
+            contacts_by_number.setdefault(contact["number"], contact)
+
+    done = set()
+    conversations = itertools.chain(
+        itertools.groupby(messages, key=operator.itemgetter(0)),
+        # evaluated lazily, i.e. once the stream is exhausted:
+        # conversations without any messages still get a folder and header
+        ((key, ()) for key in contacts if key not in done),
+    )
+    futures = []
+    # latest copy per destination, as several attachments can end up with the same name
+    pending = {}
+    # copying is bound by file system latency rather than CPU, so use plenty of threads
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as pool:
+        for key, rows in conversations:
+            done.add(key)
+            name = contacts[key]["name"]
+            logger.info(f"\tDoing attachments and markdown for: {name}")
+            is_group = contacts[key]["is_group"]
+            # some contact names are None
+            if name is None:
+                name = "None"
+            contact_path = dest / name / "media"
+            contact_path.mkdir(exist_ok=True, parents=True)
+
+            with open(
+                dest / name / "index.md", "a", buffering=1 << 20, encoding="utf-8", newline="\n"
+            ) as mdfile:
+                # Write conversation metadata header
+                print("# Signal Conversation Export", file=mdfile)
+                print(f"**Conversation:** {contacts[key].get('name') or 'Unknown'}", file=mdfile)
+                print(f"**Conversation ID:** {key}", file=mdfile)
+                print(f"**Type:** {'Group Chat' if is_group else 'Direct Message'}", file=mdfile)
+                if contacts[key].get("number"):
+                    print(f"**Phone Number:** {contacts[key]['number']}", file=mdfile)
+                if contacts[key].get("profileName"):
+                    print(f"**Profile Name:** {contacts[key]['profileName']}", file=mdfile)
+                if is_group and "members" in contacts[key]:
+                    print(f"**Group Members:** {', '.join(contacts[key]['members'])}", file=mdfile)
+                print(f"**Export Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", file=mdfile)
+                print(f"**Total Messages:** {contacts[key]['message_count']}", file=mdfile)
+                print("\n---\n", file=mdfile)
+                futures += export_conversation(
+                    src_att,
+                    contact_path,
+                    name,
+                    is_group,
+                    rows,
+                    mdfile,
+                    contacts,
+                    contacts_by_number,
+                    pool,
+                    pending,
+                    link,
+                )
 
-                # Format message with enhanced metadata
-                # Include message UUID if available for audit trail
-                msg_line = f"[{date}] {sender}: {body}"
-                if msg_uuid:
-                    msg_line += f"  <!-- MsgID: {msg_uuid} -->"
+    # re-raise anything unexpected from the copies, as the serial copy used to
+    for future in futures:
+        future.result()
 
-                print(msg_line, file=mdfile)
 
+def iter_messages(cursor, contacts: dict) -> Iterator[tuple[str, dict]]:
+    """
+    Stream (conversationId, message) pairs for known contacts, grouped by conversation.
+    Only the message fields used by the export are extracted, by SQLite rather than json.loads.
+    """
 
-def fetch_data(db_file: Path, key: str, manual: bool = False, chats: Optional[list[str]] = None) -> tuple[dict, dict]:
-    """Load SQLite data into dicts."""
+    fields = ", ".join(f"json_extract(json, '$.{field}')" for field in _MESSAGE_FIELDS)
+    cursor.arraysize = 1000
+    cursor.execute(
+        f"SELECT conversationId, {fields} FROM messages ORDER BY conversationId, sent_at"
+    )
+    while rows := cursor.fetchmany():
+        for cid, *values in rows:
+            if cid and cid in contacts:
+                # leave out missing fields, the export checks for keys rather than None
+                msg = {
+                    field: value
+                    for field, value in zip(_MESSAGE_FIELDS, values)
+                    if value is not None
+                }
+                msg["conversationId"] = cid
+                if "attachments" in msg:
+                    # arrays come back from json_extract as JSON text
+                    msg["attachments"] = _json_loads(msg["attachments"])
+                yield cid, msg
+
+
+@contextlib.contextmanager
+def fetch_data(
+    db_file: Path, key: str, manual: bool = False, chats: list[str] | None = None
+) -> Iterator[tuple[Iterator[tuple[str, dict]], dict]]:
+    """
+    Load contacts into a dict and yield it with a lazy stream of messages.
+    The database stays open, and any decrypted copy on disk, until the block exits.
+    """
+
+    # imported here so that --help and argument errors don't pay for it
+    from sqlcipher3 import dbapi2 as sqlcipher
 
     contacts = {}
-    convos = {}
 
     db_file_decrypted = db_file.parents[0] / "db-decrypt.sqlite"
 
@@ -298,14 +538,15 @@ def fetch_data(db_file: Path, key: str, manual: bool = False, chats: Optional[li
         try:
             db = sqlcipher.connect(str(db_file))
             c = db.cursor()
-            c2 = db.cursor()
             # param binding doesn't work for pragmas, so use a direct string concat
-            for cursor in [c, c2]:
-                cursor.execute(f"PRAGMA KEY = \"x'{key}'\"")
-                cursor.execute("PRAGMA cipher_page_size = 4096")
-                cursor.execute("PRAGMA kdf_iter = 64000")
-                cursor.execute("PRAGMA cipher_hmac_algorithm = HMAC_SHA512")
-                cursor.execute("PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_SHA512")
+            c.execute(f"PRAGMA KEY = \"x'{key}'\"")
+            c.execute("PRAGMA cipher_page_size = 4096")
+            c.execute("PRAGMA kdf_iter = 64000")
+            c.execute("PRAGMA cipher_hmac_algorithm = HMAC_SHA512")
+            c.execute("PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_SHA512")
+            # cipher_page_size has to match Signal's database, so it stays at 4096,
+            # but wiping every freed buffer is wasted work for a read-only export
+            c.execute("PRAGMA cipher_memory_security = OFF")
 
             # Test if decryption worked by attempting a simple query
             c.execute("SELECT count(*) FROM sqlite_master")
@@ -336,16 +577,15 @@ def fetch_data(db_file: Path, key: str, manual: bool = False, chats: Optional[li
         if db_file_decrypted.exists():
             db_file_decrypted.unlink()
         logger.info("Using manual decryption via sqlcipher CLI...")
-        command = (
-            f'echo "'
-            f"PRAGMA key = \\\"x'{key}'\\\";"
-            f"ATTACH DATABASE '{db_file_decrypted}' AS plaintext KEY '';"
+        decrypted_path = str(db_file_decrypted).replace("'", "''")
+        script = (
+            f"PRAGMA key = \"x'{key}'\";"
+            f"ATTACH DATABASE '{decrypted_path}' AS plaintext KEY '';"
             f"SELECT sqlcipher_export('plaintext');"
             f"DETACH DATABASE plaintext;"
-            f'" | sqlcipher {db_file}'
         )
-        result = os.system(command)
-        if result != 0:
+        result = subprocess.run(["sqlcipher", str(db_file)], input=script.encode(), check=False)
+        if result.returncode != 0:
             logger.error("Manual decryption failed.")
             logger.error("This could mean:")
             logger.error("  1. The database key is incorrect")
@@ -354,7 +594,13 @@ def fetch_data(db_file: Path, key: str, manual: bool = False, chats: Optional[li
             sys.exit(1)
         db = sqlcipher.connect(str(db_file_decrypted))
         c = db.cursor()
-        c2 = db.cursor()
+
+    # 64 MiB page cache (negative means KiB), so pages are decrypted only once
+    c.execute("PRAGMA cache_size = -65536")
+    # keep the ORDER BY sort scratch out of (encrypted) temp files, and map the
+    # decrypted copy from --manual; SQLCipher ignores mmap for encrypted databases
+    c.execute("PRAGMA temp_store = MEMORY")
+    c.execute("PRAGMA mmap_size = 268435456")
 
     query = "SELECT type, id, e164, name, profileName, members FROM conversations"
     if chats is not None:
@@ -371,6 +617,7 @@ def fetch_data(db_file: Path, key: str, manual: bool = False, chats: Optional[li
         logger.error("  2. Try running with the --manual flag")
         logger.error("  3. Verify the database file exists and is not corrupted")
         sys.exit(1)
+    group_members = {}
     for result in c:
         logger.info(f"\tLoading SQL results for: {result[3]}")
         is_group = result[0] == "group"
@@ -381,51 +628,250 @@ def fetch_data(db_file: Path, key: str, manual: bool = False, chats: Optional[li
             "number": result[2],
             "profileName": result[4],
             "is_group": is_group,
+            "message_count": 0,
         }
         if contacts[cid]["name"] is None:
             contacts[cid]["name"] = contacts[cid]["profileName"]
-        convos[cid] = []
 
         if is_group:
-            usable_members = []
-            # Match group members from phone number to name
             if result[5] is None:
                 logger.info("\tEmpty group.")
             else:
-                for member in result[5].split():
-                    c2.execute(
-                        "SELECT name, profileName FROM conversations WHERE id=?",
-                        [member],
-                    )
-                    for name in c2:
-                        usable_members.append(name[0] if name else member)
-                contacts[cid]["members"] = usable_members
-
-    c.execute("SELECT json, conversationId " "FROM messages " "ORDER BY sent_at")
-    for result in c:
-        content = json.loads(result[0])
-        cid = result[1]
-        if cid and cid in convos:
-            convos[cid].append(content)
+                group_members[cid] = result[5].split()
+
+    # Match group members from id to name, looking all of them up at once
+    member_ids = list({member for members in group_members.values() for member in members})
+    member_names = {}
+    # stay below SQLite's default limit of 999 bound parameters
+    for i in range(0, len(member_ids), 900):
+        batch = member_ids[i : i + 900]
+        c.execute(
+            f"SELECT id, name FROM conversations WHERE id IN ({','.join('?' * len(batch))})",
+            batch,
+        )
+        member_names.update(c)
+    for cid, members in group_members.items():
+        contacts[cid]["members"] = [
+            member_names[member] for member in members if member in member_names
+        ]
 
-    if db_file_decrypted.exists():
-        db_file_decrypted.unlink()
+    c.execute("SELECT conversationId, count(*) FROM messages GROUP BY conversationId")
+    for cid, count in c:
+        if cid in contacts:
+            contacts[cid]["message_count"] = count
 
-    return convos, contacts
+    try:
+        yield iter_messages(c, contacts), contacts
+    finally:
+        db.close()
+        if db_file_decrypted.exists():
+            db_file_decrypted.unlink()
 
 
 def fix_names(contacts: dict) -> dict:
     """Remove non-filesystem-friendly characters from names."""
 
-    for key, item in contacts.items():
-        contact_name = item["number"] if item["name"] is None else item["name"]
-        if contacts[key]["name"] is not None:
-            contacts[key]["name"] = "".join(x for x in contact_name if x.isalnum())
+    for item in contacts.values():
+        name = item["name"]
+        if name is not None:
+            name = name.translate(_NON_ALNUM_ASCII)
+            if not name.isascii():
+                name = "".join(x for x in name if x.isalnum())
+            item["name"] = name
 
     return contacts
 
 
+@functools.cache
+def _html_tools():
+    """
+    Markdown converter and parsed media templates for rendering HTML, built once per
+    process; every embed gets its own copy of the templates.
+    """
+    import markdown
+    from bs4 import BeautifulSoup
+
+    md = markdown.Markdown()
+    # whole documents rather than just their tags, to keep the whitespace around embeds
+    figure_soup = BeautifulSoup(figure_template, "html.parser")
+    audio_soup = BeautifulSoup(audio_template, "html.parser")
+    video_soup = BeautifulSoup(video_template, "html.parser")
+    return md, figure_soup, audio_soup, video_soup
+
+
+def _render_conversation(sub: Path, msgs_per_page: int) -> None:
+    """Render the index.md of one conversation directory to its index.html."""
+    from bs4 import BeautifulSoup
+
+    md, figure_soup, audio_soup, video_soup = _html_tools()
+
+    name = sub.stem
+    path = sub / "index.md"
+    # touch first
+    path.touch(exist_ok=True)
+    with path.open("rb") as f:
+        lines = f.readlines()
+    lines = lines_to_msgs(lines)
+    last_page = int(len(lines) / msgs_per_page)
+
+    with open(sub / "index.html", "w", encoding="utf-8") as htfile:
+        print(
+            "<!doctype html>"
+            "<html lang='en'><head>"
+            "<meta charset='utf-8'>"
+            f"<title>{name}</title>"
+            "<link rel=stylesheet href='../style.css'>"
+            "</head>"
+            "<body>"
+            "<style>"
+            "img.emoji {"
+            "height: 1em;"
+            "width: 1em;"
+            "margin: 0 .05em 0 .1em;"
+            "vertical-align: -0.1em;"
+            "}"
+            "</style>"
+            "<script src='https://cdn.jsdelivr.net/npm/twemoji@14.0.2/dist/twemoji.min.js?11.2'></script>"
+            "<script>window.onload = function () { twemoji.parse(document.body);}</script>",
+            file=htfile,
+        )
+
+        # rendered messages are written out in chunks rather than one by one
+        out = []
+        page_num = 0
+        for i, msg in enumerate(lines):
+            if i % msgs_per_page == 0:
+                nav = ""
+                if i > 0:
+                    nav += "&nbsp;"
+                nav += f"&nbsp;"
+                nav += "&nbsp;"
+                nav += "&nbsp;"
+                if page_num != 0:
+                    nav += f"&nbsp;"
+                else:
+                    nav += "&nbsp;"
+                nav += "</div><div class=next>"
+                if page_num != last_page:
+                    nav += f"&nbsp;"
+                else:
+                    nav += "&nbsp;"
+                nav += "</div></nav>"
+                out.append(nav + "\n")
+                page_num += 1
+
+            date, sender, body = (part.decode(errors="replace") for part in msg)
+            sender = sender[1:-1]  # Remove leading/trailing space and colon
+            date, time = date[1:-1].replace(",", "").split(" ")
+
+            # Extract phone number and profile name from sender if present
+            # Format: "Name [+1234567890] (Profile: X)"
+            sender_display = sender
+            phone_number = ""
+            profile_name = ""
+
+            # Extract phone number or ID
+            phone_match = re.search(r'\[([^\]]+)\]', sender)
+            if phone_match:
+                phone_number = phone_match.group(1)
+
+            # Extract profile name
+            profile_match = re.search(r'\(Profile: ([^\)]+)\)', sender)
+            if profile_match:
+                profile_name = profile_match.group(1)
+
+            # Clean up sender for display (remove brackets and profile info for main display)
+            # But keep it in data attributes for archival
+            sender_clean = re.sub(r'\s*\[[^\]]+\]\s*', ' ', sender)
+            sender_clean = re.sub(r'\s*\(Profile:[^\)]+\)\s*', '', sender_clean).strip()
+
+            plain = _PLAIN_RE.fullmatch(body)
+            # raw HTML typed into a message has to be balanced by the soup below
+            msg_id = _MSGID_RE.search(body)
+            raw_html = plain is None and "<" in (body[: msg_id.start()] if msg_id else body)
+            body = f"<p>{plain.group(1)}</p>" if plain else md.convert(body)
+
+            # links
+            if "http" in body:
+                body = _LINK_RE.sub(r"<a href='\g<0>' target='_blank'>\g<0></a> ", body)
+
+            # media embeds and raw HTML need BeautifulSoup, most messages have neither
+            if raw_html or "<img" in body or ".m4a" in body or ".mp4" in body:
+                # images
+                soup = BeautifulSoup(body, _PARSER)
+                imgs = soup.find_all("img")
+                for im in imgs:
+                    if im.get("src"):
+                        temp = copy.copy(figure_soup)
+                        src = im["src"]
+                        temp.div.label.div.img["src"] = src
+                        temp.label.img["src"] = src
+
+                        alt = im["alt"]
+                        temp.label["for"] = alt
+                        temp.label.img["alt"] = alt
+                        temp.input["id"] = alt
+                        temp.div.label["for"] = alt
+                        temp.div.label.div.img["alt"] = alt
+                        im.replace_with(temp)
+
+                # voice notes
+                voices = soup.select(r"a[href*=\.m4a]")
+                for v in voices:
+                    href = v["href"]
+                    temp = copy.copy(audio_soup)
+                    temp.source["src"] = href
+                    v.replace_with(temp)
+
+                # videos
+                videos = soup.select(r"a[href*=\.mp4]")
+                for v in videos:
+                    href = v["href"]
+                    temp = copy.copy(video_soup)
+                    temp.source["src"] = href
+                    v.replace_with(temp)
+
+                # lxml wraps fragments in <html><body>, html.parser does not
+                root = soup.body if _PARSER == "lxml" and soup.body else soup
+                body = root.decode_contents(formatter="minimal")
+
+            cl = "msg me" if sender_clean.startswith("Me") else "msg"
+
+            # Build data attributes for archival metadata
+            data_attrs = ""
+            if phone_number:
+                data_attrs += f" data-phone='{phone_number}'"
+            if profile_name:
+                data_attrs += f" data-profile='{profile_name}'"
+
+            # Create sender HTML with tooltip showing full info
+            sender_title = sender  # Full sender info in tooltip
+            sender_html = f"<span class=sender title='{sender_title}'{data_attrs}>{sender_clean}</span>"
+
+            out.append(
+                f"<div class='{cl}'{data_attrs}>"
+                f"<span class=date>{date}</span>"
+                f"<span class=time>{time}</span>"
+                f"{sender_html}"
+                f"<span class=body>{body}</span></div>\n"
+            )
+            if len(out) >= 500:
+                htfile.write("".join(out))
+                out.clear()
+        htfile.write("".join(out))
+        print("</div>", file=htfile)
+        print(
+            "<script>if (!document.location.hash){"
+            "document.location.hash = 'pg0';}</script>",
+            file=htfile,
+        )
+        print("</body></html>", file=htfile)
+
+
 def create_html(dest: Path, msgs_per_page: int = 100) -> None:
+    # imported here so that --help and argument errors don't pay for multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
     root = Path(__file__).resolve().parents[0]
     css_source = root / "style.css"
     css_dest = dest / "style.css"
@@ -436,158 +882,14 @@ def create_html(dest: Path, msgs_per_page: int = 100) -> None:
         logger.warning(f"HTML files will be created without styling.")
         logger.warning(f"You can add a stylesheet manually at: {css_dest}")
 
-    md = markdown.Markdown()
-
-    for sub in dest.iterdir():
-        if sub.is_dir():
-            name = sub.stem
-            logger.info(f"\tDoing html for {name}")
-            path = sub / "index.md"
-            # touch first
-            path.touch(exist_ok=True)
-            with path.open() as f:
-                lines = f.readlines()
-            lines = lines_to_msgs(lines)
-            last_page = int(len(lines) / msgs_per_page)
-
-            with open(sub / "index.html", "w") as htfile:
-                print(
-                    "<!doctype html>"
-                    "<html lang='en'><head>"
-                    "<meta charset='utf-8'>"
-                    f"<title>{name}</title>"
-                    "<link rel=stylesheet href='../style.css'>"
-                    "</head>"
-                    "<body>"
-                    "<style>"
-                    "img.emoji {"
-                    "height: 1em;"
-                    "width: 1em;"
-                    "margin: 0 .05em 0 .1em;"
-                    "vertical-align: -0.1em;"
-                    "}"
-                    "</style>"
-                    "<script src='https://cdn.jsdelivr.net/npm/twemoji@14.0.2/dist/twemoji.min.js?11.2'></script>"
-                    "<script>window.onload = function () { twemoji.parse(document.body);}</script>",
-                    file=htfile,
-                )
-
-                page_num = 0
-                for i, msg in enumerate(lines):
-                    if i % msgs_per_page == 0:
-                        nav = ""
-                        if i > 0:
-                            nav += "&nbsp;"
-                        nav += f"&nbsp;"
-                        nav += "&nbsp;"
-                        nav += "&nbsp;"
-                        if page_num != 0:
-                            nav += f"&nbsp;"
-                        else:
-                            nav += "&nbsp;"
-                        nav += "</div><div class=next>"
-                        if page_num != last_page:
-                            nav += f"&nbsp;"
-                        else:
-                            nav += "&nbsp;"
-                        nav += "</div></nav>"
-                        print(nav, file=htfile)
-                        page_num += 1
-
-                    date, sender, body = msg
-                    sender = sender[1:-1]  # Remove leading/trailing space and colon
-                    date, time = date[1:-1].replace(",", "").split(" ")
-
-                    # Extract phone number and profile name from sender if present
-                    # Format: "Name [+1234567890] (Profile: X)"
-                    sender_display = sender
-                    phone_number = ""
-                    profile_name = ""
-
-                    # Extract phone number or ID
-                    phone_match = re.search(r'\[([^\]]+)\]', sender)
-                    if phone_match:
-                        phone_number = phone_match.group(1)
-
-                    # Extract profile name
-                    profile_match = re.search(r'\(Profile: ([^\)]+)\)', sender)
-                    if profile_match:
-                        profile_name = profile_match.group(1)
-
-                    # Clean up sender for display (remove brackets and profile info for main display)
-                    # But keep it in data attributes for archival
-                    sender_clean = re.sub(r'\s*\[[^\]]+\]\s*', ' ', sender)
-                    sender_clean = re.sub(r'\s*\(Profile:[^\)]+\)\s*', '', sender_clean).strip()
-
-                    body = md.convert(body)
-
-                    # links
-                    p = r"(https{0,1}://\S*)"
-                    template = r"<a href='\1' target='_blank'>\1</a> "
-                    body = re.sub(p, template, body)
-
-                    # images
-                    soup = BeautifulSoup(body, "html.parser")
-                    imgs = soup.find_all("img")
-                    for im in imgs:
-                        if im.get("src"):
-                            temp = BeautifulSoup(figure_template, "html.parser")
-                            src = im["src"]
-                            temp.figure.div.label.div.img["src"] = src
-                            temp.figure.label.img["src"] = src
-
-                            alt = im["alt"]
-                            temp.figure.label["for"] = alt
-                            temp.figure.label.img["alt"] = alt
-                            temp.figure.input["id"] = alt
-                            temp.figure.div.label["for"] = alt
-                            temp.figure.div.label.div.img["alt"] = alt
-                            im.replace_with(temp)
-
-                    # voice notes
-                    voices = soup.select(r"a[href*=\.m4a]")
-                    for v in voices:
-                        href = v["href"]
-                        temp = BeautifulSoup(audio_template, "html.parser")
-                        temp.audio.source["src"] = href
-                        v.replace_with(temp)
-
-                    # videos
-                    videos = soup.select(r"a[href*=\.mp4]")
-                    for v in videos:
-                        href = v["href"]
-                        temp = BeautifulSoup(video_template, "html.parser")
-                        temp.video.source["src"] = href
-                        v.replace_with(temp)
-
-                    cl = "msg me" if sender_clean.startswith("Me") else "msg"
-
-                    # Build data attributes for archival metadata
-                    data_attrs = ""
-                    if phone_number:
-                        data_attrs += f" data-phone='{phone_number}'"
-                    if profile_name:
-                        data_attrs += f" data-profile='{profile_name}'"
-
-                    # Create sender HTML with tooltip showing full info
-                    sender_title = sender  # Full sender info in tooltip
-                    sender_html = f"<span class=sender title='{sender_title}'{data_attrs}>{sender_clean}</span>"
-
-                    print(
-                        f"<div class='{cl}'{data_attrs}>"
-                        f"<span class=date>{date}</span>"
-                        f"<span class=time>{time}</span>"
-                        f"{sender_html}"
-                        f"<span class=body>{soup.prettify()}</span></div>",
-                        file=htfile,
-                    )
-                print("</div>", file=htfile)
-                print(
-                    "<script>if (!document.location.hash){"
-                    "document.location.hash = 'pg0';}</script>",
-                    file=htfile,
-                )
-                print("</body></html>", file=htfile)
+    # conversations are independent and rendering them is CPU bound, so use processes
+    with ProcessPoolExecutor() as pool:
+        futures = []
+        for sub in subdirs(dest):
+            logger.info(f"\tDoing html for {sub.stem}")
+            futures.append(pool.submit(_render_conversation, sub, msgs_per_page))
+        for future in futures:
+            future.result()
 
 
 video_template = """
@@ -620,22 +922,18 @@ figure_template = """
 """
 
 
-def lines_to_msgs(lines: list[str]) -> list:
+def lines_to_msgs(lines: list[bytes]) -> list[list[bytes]]:
     """
-    Parse markdown lines into messages.
+    Parse markdown lines, read in binary mode, into messages.
     Now handles enhanced sender format: [timestamp] Name [+phone] (Profile: X): body
     """
-    # Updated regex to handle phone numbers and profile names in sender field
-    # Matches: [date time] sender_info: body
-    # Where sender_info can include [phone], (Profile: name), etc.
-    p = re.compile(r"^(\[\d{4}-\d{2}-\d{2},{0,1} \d{2}:\d{2}\])(.+?:)(.*)")
     msgs = []
     for li in lines:
         # Skip metadata header lines
-        if li.startswith('#') or li.startswith('**') or li.startswith('---'):
+        if li.startswith((b'#', b'**', b'---')):
             continue
 
-        m = p.match(li)
+        m = _MSG_RE.match(li)
         if m:
             msgs.append(list(m.groups()))
         else:
@@ -643,7 +941,7 @@ def lines_to_msgs(lines: list[str]) -> list:
             if msgs:
                 msgs[-1][-1] += li
             else:
-                logger.warning(f"Skipping malformed line (no previous message): {li[:50]}...")
+                logger.warning(f"Skipping malformed line (no previous message): {li[:50].decode(errors='replace')}...")
     return msgs
 
 
@@ -661,13 +959,14 @@ def merge_attachments(media_new: Path, media_old: Path) -> None:
     media_new.mkdir(parents=True, exist_ok=True)
 
     try:
-        for f in media_old.iterdir():
-            if f.is_file():
-                dest_file = media_new / f.name
-                if not dest_file.exists():
-                    shutil.copy2(f, media_new)
-                else:
-                    logger.info(f"\t\tSkipping existing file: {f.name}")
+        with os.scandir(media_old) as entries:
+            for f in entries:
+                if f.is_file():
+                    dest_file = media_new / f.name
+                    if not dest_file.exists():
+                        shutil.copy2(f.path, media_new)
+                    else:
+                        logger.info(f"\t\tSkipping existing file: {f.name}")
     except Exception as e:
         logger.warning(f"\t\tError merging attachments: {e}")
 
@@ -683,9 +982,9 @@ def merge_chat(path_new: Path, path_old: Path) -> None:
         return
 
     try:
-        with path_old.open() as f:
+        with path_old.open("rb") as f:
             old = f.readlines()
-        with path_new.open() as f:
+        with path_new.open("rb") as f:
             new = f.readlines()
 
         # Check if files are empty
@@ -694,13 +993,15 @@ def merge_chat(path_new: Path, path_old: Path) -> None:
             return
         if not new:
             logger.info("\t\tNew chat file is empty, using old only")
-            with path_new.open("w") as f:
+            with path_new.open("wb") as f:
                 f.writelines(old)
             return
 
         # Show preview of what we're merging
         try:
-            a, b, c, d = old[0][:30], old[-1][:30], new[0][:30], new[-1][:30]
+            a, b, c, d = (
+                li[:30].decode(errors="replace") for li in (old[0], old[-1], new[0], new[-1])
+            )
             logger.info(f"\t\tFirst line old:\t{a}")
             logger.info(f"\t\tLast line old:\t{b}")
             logger.info(f"\t\tFirst line new:\t{c}")
@@ -716,15 +1017,25 @@ def merge_chat(path_new: Path, path_old: Path) -> None:
             logger.warning("\t\tNo messages found in either file")
             return
 
-        # Merge and deduplicate
-        merged = old_msgs + new_msgs
-        merged = [m[0] + m[1] + m[2] for m in merged]
-        merged = list(dict.fromkeys(merged))  # Remove duplicates while preserving order
-
-        logger.info(f"\t\tMerged {len(old_msgs)} old + {len(new_msgs)} new = {len(merged)} total messages")
-
-        with path_new.open("w") as f:
-            f.writelines(merged)
+        # Merge and deduplicate, keeping the first occurrence of each message. Messages
+        # carrying a MsgID are hashed on date, sender and ID rather than the whole body;
+        # they only count as duplicates if the lines match too, so edited text is kept
+        seen = {}
+        total = 0
+        with path_new.open("wb") as f:
+            for m in itertools.chain(old_msgs, new_msgs):
+                date, sender, body = m
+                line = date + sender + body
+                i = body.rfind(b"<!-- MsgID: ")
+                key = date + sender + body[i:] if i >= 0 and body.rstrip().endswith(b"-->") else line
+                lines = seen.setdefault(key, [])
+                if line in lines:
+                    continue
+                lines.append(line)
+                total += 1
+                f.write(line)
+
+        logger.info(f"\t\tMerged {len(old_msgs)} old + {len(new_msgs)} new = {total} total messages")
 
     except Exception as e:
         logger.error(f"\t\tError merging chat: {e}")
@@ -755,87 +1066,93 @@ def merge_with_old(dest: Path, old: Path) -> None:
     merged_count = 0
     skipped_count = 0
 
-    for sub in dest.iterdir():
-        if sub.is_dir():
-            name = sub.stem
-            dir_old = old / name
-
-            if dir_old.is_dir():
-                logger.info(f"\tMerging conversation: {name}")
-                merge_attachments(sub / "media", dir_old / "media")
-                path_new = sub / "index.md"
-                path_old = dir_old / "index.md"
-                merge_chat(path_new, path_old)
-                merged_count += 1
-            else:
-                logger.info(f"\tSkipping {name} (not in old export)")
-                skipped_count += 1
-            print()
+    for sub in subdirs(dest):
+        name = sub.stem
+        dir_old = old / name
+
+        if dir_old.is_dir():
+            logger.info(f"\tMerging conversation: {name}")
+            merge_attachments(sub / "media", dir_old / "media")
+            path_new = sub / "index.md"
+            path_old = dir_old / "index.md"
+            merge_chat(path_new, path_old)
+            merged_count += 1
+        else:
+            logger.info(f"\tSkipping {name} (not in old export)")
+            skipped_count += 1
+        print()
 
     logger.info(f"Merge complete: {merged_count} conversations merged, {skipped_count} skipped")
 
 
-@click.command()
-@click.argument("dest", type=click.Path(), default="output")
-@click.option(
-    "--source", "-s", type=click.Path(), help="Path to Signal source and database"
-)
-@click.option(
-    "--chats",
-    "-c",
-    help="Comma-separated chat names to include. These are contact names or group names",
-)
-@click.option(
-    "--list-chats",
-    is_flag=True,
-    default=False,
-    help="List all available chats/conversations and then quit",
-)
-@click.option("--old", type=click.Path(), help="Path to previous export to merge with")
-@click.option(
-    "--overwrite",
-    "-o",
-    is_flag=True,
-    default=False,
-    help="Flag to overwrite existing output",
-)
-@click.option(
-    "--verbose",
-    "-v",
-    is_flag=True,
-    default=False,
-    help="Enable verbose output logging",
-)
-@click.option(
-    "--manual",
-    "-m",
-    is_flag=True,
-    default=False,
-    help="Whether to manually decrypt the db",
-)
-def main(
-    dest,
-    old=None,
-    source=None,
-    overwrite=False,
-    verbose=False,
-    manual=False,
-    chats=None,
-    list_chats=None,
-):
+def main(argv: list[str] | None = None) -> None:
     """
     Read the Signal directory and output attachments and chat files to DEST directory.
     Assumes the following default directories, can be overridden wtih --source.
 
     Default for DEST is a sub-directory output/ in the current directory.
 
-    \b
     Default Signal directories:
      - Linux: ~/.config/Signal
      - macOS: ~/Library/Application Support/Signal
      - Windows: ~/AppData/Roaming/Signal
     """
 
+    parser = argparse.ArgumentParser(
+        prog="signal-export",
+        description=textwrap.dedent(main.__doc__),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("dest", metavar="DEST", nargs="?", default="output")
+    parser.add_argument(
+        "-s", "--source", metavar="PATH", help="Path to Signal source and database"
+    )
+    parser.add_argument(
+        "-c",
+        "--chats",
+        help="Comma-separated chat names to include. These are contact names or group names",
+    )
+    parser.add_argument(
+        "--list-chats",
+        action="store_true",
+        help="List all available chats/conversations and then quit",
+    )
+    parser.add_argument("--old", metavar="PATH", help="Path to previous export to merge with")
+    parser.add_argument(
+        "-o",
+        "--overwrite",
+        action="store_true",
+        help="Flag to overwrite existing output",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output logging",
+    )
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="Hardlink attachments instead of copying them. Saves space, but editing them in place also edits Signal's copies",
+    )
+    parser.add_argument(
+        "-m",
+        "--manual",
+        action="store_true",
+        help="Whether to manually decrypt the db",
+    )
+    args = parser.parse_args(argv)
+
+    dest = args.dest
+    old = args.old
+    source = args.source
+    overwrite = args.overwrite
+    verbose = args.verbose
+    manual = args.manual
+    link = args.link
+    chats = args.chats
+    list_chats = args.list_chats
+
     if verbose:
         logging.basicConfig(level=logging.INFO, format='%(message)s')
         logger.info("Verbose logging enabled")
@@ -877,36 +1194,35 @@ def main(
         sys.exit(1)
 
     try:
-        with open(source, "r") as conf:
-            config_data = json.loads(conf.read())
-
-            # Try different possible key names (Signal has changed this over time)
-            key = None
-            possible_keys = ["key", "encryptionKey", "safeStorageKey", "encrypted_key"]
-
-            for key_name in possible_keys:
-                if key_name in config_data:
-                    key = config_data[key_name]
-                    logger.info(f"Found encryption key using field: '{key_name}'")
-                    break
-
-            if key is None:
-                logger.error("Could not find encryption key in config.json")
-                logger.error(f"Config file: {source}")
-                logger.error(f"Available fields: {list(config_data.keys())}")
-                logger.error("")
-                logger.error("This may indicate:")
-                logger.error("  1. Signal has changed its config file format")
-                logger.error("  2. Your Signal installation is corrupted")
-                logger.error("  3. You need to update this tool")
-                logger.error("")
-                logger.error("Please report this issue with the available fields listed above")
-                sys.exit(1)
-
-            # Validate key format (should be a hex string)
-            if not isinstance(key, str) or len(key) < 32:
-                logger.warning(f"Encryption key seems unusually short or invalid (length: {len(key)})")
-                logger.warning("This may cause decryption to fail")
+        config_data = _json_loads(source.read_bytes())
+
+        # Try different possible key names (Signal has changed this over time)
+        key = None
+        possible_keys = ["key", "encryptionKey", "safeStorageKey", "encrypted_key"]
+
+        for key_name in possible_keys:
+            if key_name in config_data:
+                key = config_data[key_name]
+                logger.info(f"Found encryption key using field: '{key_name}'")
+                break
+
+        if key is None:
+            logger.error("Could not find encryption key in config.json")
+            logger.error(f"Config file: {source}")
+            logger.error(f"Available fields: {list(config_data.keys())}")
+            logger.error("")
+            logger.error("This may indicate:")
+            logger.error("  1. Signal has changed its config file format")
+            logger.error("  2. Your Signal installation is corrupted")
+            logger.error("  3. You need to update this tool")
+            logger.error("")
+            logger.error("Please report this issue with the available fields listed above")
+            sys.exit(1)
+
+        # Validate key format (should be a hex string)
+        if not isinstance(key, str) or len(key) < 32:
+            logger.warning(f"Encryption key seems unusually short or invalid (length: {len(key)})")
+            logger.warning("This may cause decryption to fail")
 
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse config file as JSON: {e}")
@@ -930,34 +1246,32 @@ def main(
         sys.exit(1)
 
     logger.info(f"\nFetching data from {db_file}\n")
-    convos, contacts = fetch_data(db_file, key, manual=manual, chats=chats)
-
-    if list_chats:
-        names = sorted(v["name"] for v in contacts.values() if v["name"] is not None)
-        print("\n".join(names))
-        sys.exit()
-
-    dest = Path(dest).expanduser()
-    if not dest.is_dir():
-        dest.mkdir(parents=True)
-    elif overwrite:
-        logger.warning(f"Overwriting existing directory: {dest}")
-        shutil.rmtree(dest)
-        dest.mkdir(parents=True)
-    else:
-        logger.error(f"Output directory already exists: {dest}")
-        logger.error("")
-        logger.error("Options:")
-        logger.error("  1. Use --overwrite to replace the existing export")
-        logger.error("  2. Use --old to merge with the existing export")
-        logger.error("  3. Specify a different output directory")
-        sys.exit(1)
+    with fetch_data(db_file, key, manual=manual, chats=chats) as (messages, contacts):
+        if list_chats:
+            names = sorted(v["name"] for v in contacts.values() if v["name"] is not None)
+            print("\n".join(names))
+            sys.exit()
+
+        dest = Path(dest).expanduser()
+        if not dest.is_dir():
+            dest.mkdir(parents=True)
+        elif overwrite:
+            logger.warning(f"Overwriting existing directory: {dest}")
+            shutil.rmtree(dest)
+            dest.mkdir(parents=True)
+        else:
+            logger.error(f"Output directory already exists: {dest}")
+            logger.error("")
+            logger.error("Options:")
+            logger.error("  1. Use --overwrite to replace the existing export")
+            logger.error("  2. Use --old to merge with the existing export")
+            logger.error("  3. Specify a different output directory")
+            sys.exit(1)
+
+        contacts = fix_names(contacts)
+        print("\nCopying attachments and creating markdown files")
+        make_simple(src, dest, messages, contacts, link=link)
 
-    contacts = fix_names(contacts)
-    print("\nCopying and renaming attachments")
-    copy_attachments(src, dest, convos, contacts)
-    print("\nCreating markdown files")
-    make_simple(dest, convos, contacts)
     if old:
         print(f"\nMerging old at {old} into output directory")
         print("No existing files will be deleted or overwritten!")